@@ -10,8 +10,8 @@
  *
  * Features:
  *   • Quoted-path support (spaces, special chars)
- *   • STORAGE, LIST, CREATE_DIR, PUTFILE, GETSIZE, GETDATA,
- *     DELETE, REMOVE_DIR, RENAME
+ *   • STORAGE, LIST, STAT, CREATE_DIR, PUTFILE, GETSIZE, GETDATA,
+ *     DELETE, DELETE_MANY, REMOVE_DIR, RENAME
  *   • Recursive directory listing (listDir helper)
  *   • Non-blocking PUTFILE with chunked flow control
  *   • Simple, robust, no extra libraries
@@ -39,6 +39,7 @@
 
 #include <Arduino.h>
 #include <SD_MMC.h>
+#include <esp_rom_crc.h>
 
 class ESP32FileManager {
 public:
@@ -72,6 +73,19 @@ public:
     cmd.trim();
     if (cmd.length() == 0) return;
 
+    // Optional "#<n> " tag: echo it on its own line ahead of the reply so the
+    // client can tell this reply from leftovers of an earlier command.
+    // Tagged clients also get the binary reply formats (see STORAGE, GETDATA).
+    bool tagged = false;
+    if (cmd.startsWith("#")) {
+      int sp = cmd.indexOf(' ');
+      if (sp == -1) return;
+      Serial.println(cmd.substring(0, sp));
+      tagged = true;
+      cmd = cmd.substring(sp + 1);
+      cmd.trim();
+    }
+
     // ---------- Helper: extract quoted path ----------
     auto getPath = [&](const String& c, int start) -> String {
       int q1 = c.indexOf('"', start);
@@ -84,8 +98,16 @@ public:
     // ---------- STORAGE ----------
     if (cmd == "STORAGE") {
       uint64_t total = SD_MMC.totalBytes();
-      uint64_t used  = SD_MMC.usedBytes();
-      Serial.printf("TOTAL:%llu FREE:%llu\n", total, total - used);
+      uint64_t free  = total - SD_MMC.usedBytes();
+      if (tagged) {
+        // Binary: 'S', then total and free bytes as little-endian uint64
+        uint64_t sizes[2] = { total, free };
+        Serial.write('S');
+        Serial.write((const uint8_t *)sizes, sizeof(sizes));
+        Serial.println();
+      } else {
+        Serial.printf("TOTAL:%llu FREE:%llu\n", total, free);
+      }
       Serial.println("DONE");
 
     // ---------- LIST ----------
@@ -94,10 +116,17 @@ public:
       listDir(SD_MMC, path.c_str(), 0);
       Serial.println("DONE");
 
+    // ---------- STAT ----------
+    } else if (cmd.startsWith("STAT ")) {
+      // Change counter the client compares against its cached listings
+      Serial.printf("GEN:%lu\n", (unsigned long)_generation);
+      Serial.println("DONE");
+
     // ---------- CREATE_DIR ----------
     } else if (cmd.startsWith("CREATE_DIR ")) {
       String path = getPath(cmd, 11);
       createDir(SD_MMC, path.c_str());
+      _generation++;
       Serial.println("DIR created");
       Serial.println("DONE");
 
@@ -118,6 +147,7 @@ public:
         Serial.println("DONE");
         return;
       }
+      _generation++;
 
       _putReceived = 0;
       _putChunkPos = 0;
@@ -143,17 +173,30 @@ public:
 
     // ---------- GETDATA ----------
     } else if (cmd.startsWith("GETDATA ")) {
+      // Tagged: 8-byte little-endian length, the data, 4-byte little-endian CRC-32;
+      // a length of all 0xFF bytes means the file could not be opened.
+      // Untagged: the raw data (size from GETSIZE), then a CRC:xxxxxxxx text line.
       String path = getPath(cmd, 8);
       File f = SD_MMC.open(path.c_str());
       if (!f || f.isDirectory()) {
         if (f) f.close();
+        if (tagged) {
+          uint64_t err = UINT64_MAX;
+          Serial.write((const uint8_t *)&err, sizeof(err));
+        }
         return;
       }
+      if (tagged) {
+        uint64_t size = f.size();
+        Serial.write((const uint8_t *)&size, sizeof(size));  // ESP32 is little-endian
+      }
       uint8_t buf[1024];
+      uint32_t crc = 0;
       unsigned long lastKA = millis();
       while (f.available()) {
         size_t len = f.read(buf, sizeof(buf));
         Serial.write(buf, len);
+        crc = esp_rom_crc32_le(crc, buf, len);  // Same CRC-32 as zlib.crc32
         if (millis() - lastKA >= 200) {
           if (_keepAliveCallback) _keepAliveCallback();
           lastKA = millis();
@@ -161,17 +204,44 @@ public:
         }
       }
       f.close();
+      if (tagged) {
+        Serial.write((const uint8_t *)&crc, sizeof(crc));
+      } else {
+        Serial.printf("CRC:%08lX\n", (unsigned long)crc);
+      }
 
     // ---------- DELETE ----------
     } else if (cmd.startsWith("DELETE ")) {
       String path = getPath(cmd, 7);
+      _generation++;
       Serial.println(SD_MMC.remove(path.c_str()) ? "DELETED" : "ERROR");
       Serial.println("DONE");
 
+    // ---------- DELETE_MANY ----------
+    } else if (cmd.startsWith("DELETE_MANY ")) {
+      // Followed by <count> lines, one unquoted path each (files, or folders
+      // already emptied by earlier lines). Each path is answered as it goes.
+      int count = cmd.substring(12).toInt();
+      _generation++;
+      unsigned long lastKA = millis();
+      for (int i = 0; i < count; i++) {
+        String path = Serial.readStringUntil('\n');
+        if (path.endsWith("\r")) path.remove(path.length() - 1);
+        bool ok = SD_MMC.remove(path.c_str()) || SD_MMC.rmdir(path.c_str());
+        Serial.print(ok ? "DELETED : " : "ERROR : ");
+        Serial.println(path);
+        if (millis() - lastKA >= 200) {
+          if (_keepAliveCallback) _keepAliveCallback();
+          lastKA = millis();
+        }
+      }
+      Serial.println("DONE");
+
     // ---------- REMOVE_DIR ----------
     } else if (cmd.startsWith("REMOVE_DIR ")) {
       String path = getPath(cmd, 11);
       removeDir(SD_MMC, path.c_str());
+      _generation++;
       Serial.println("REMOVED");
       Serial.println("DONE");
 
@@ -198,6 +268,7 @@ public:
       if (!to.startsWith("/"))   to   = "/" + to;
 
       bool success = SD_MMC.rename(from.c_str(), to.c_str());
+      _generation++;
       Serial.println(success ? "RENAMED" : "ERROR");
       Serial.println("DONE");
     }
@@ -207,17 +278,21 @@ private:
   // -----------------------------------------------------------------
   // PUTFILE non-blocking state
   // -----------------------------------------------------------------
-  static const int PUT_CHUNK = 4096;
+  static const int PUT_CHUNK = 32768;  // One NEXT round-trip per 32 KB
   bool _putActive = false;
   File _putFile;
   long _putSize = 0;
   long _putReceived = 0;
   int  _putChunkPos = 0;
   unsigned long _putLastData = 0;
-  uint8_t _putBuf[4096];
+  uint8_t _putBuf[PUT_CHUNK];
   void (*_keepAliveCallback)() = nullptr;
   unsigned long _lastKeepAlive = 0;
 
+  // Bumped by every command that changes the card (reported by STAT).
+  // Seeded randomly so a reboot does not replay numbers a client has cached.
+  uint32_t _generation = esp_random();
+
   // Loops internally for the entire PUTFILE transfer.
   // Uses available()+read() instead of timed readBytes for reliable HWCDC support.
   // Keep-alive callback fires every ~200ms for heartbeat support.
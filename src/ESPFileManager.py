@@ -3,18 +3,105 @@ from tkinter import ttk, simpledialog, messagebox, filedialog, scrolledtext
 import serial
 import serial.tools.list_ports
 import os
+import posixpath
+import re
+import select
+import struct
 import threading
+import queue
+import collections
 import time
 import ctypes
 import sys
+import zlib
+
+# One compiled pass per LIST line: "DIR : name" or "FILE : name SIZE : 123"
+_LIST_RE = re.compile(r"(?:DIR :\s*(?P<dir>.*)|FILE :\s*(?P<file>.*?)\s+SIZE : (?P<size>\d+))\Z")
+# STORAGE reply from older firmware: "TOTAL:123 FREE:45"
+_STORAGE_RE = re.compile(r"TOTAL:(\d+) FREE:(\d+)")
+# GETDATA length header sent instead of a size when the file can't be opened
+_GETDATA_ERROR = b"\xff" * 8
+
+def _quote(path):
+    """Quote a remote path for a command line (the firmware reads paths between quotes)"""
+    return f'"{path}"'
+
+
+# Hover/active shade shared by the dark-theme style maps and buttons
+_HOVER = "#4a4a4a"
+
+
+def _install_dark_theme(root, accent, fg, bg, hl):
+    """Configure the ttk styles and option-database entries once per Tk root"""
+    if getattr(root, "_dark_installed", False):
+        return
+    root._dark_installed = True
+    style = ttk.Style(root)
+    style.theme_use('clam')
+
+    # Treeview styling
+    style.configure("Treeview", background=accent, foreground=fg, fieldbackground=accent, borderwidth=0)
+    style.configure("Treeview.Heading", background="#2d2d2d", foreground=fg, borderwidth=0, relief="flat")
+    style.map("Treeview", background=[("selected", hl)], foreground=[("selected", "white")])
+    style.map("Treeview.Heading", background=[("active", _HOVER)])
+
+    # Combobox styling (including dropdown)
+    style.configure("TCombobox", fieldbackground=accent, background=accent, foreground=fg,
+                    arrowcolor=fg, bordercolor=accent, lightcolor=accent, darkcolor=accent)
+    disabled_fg = [("disabled", "#808080")]
+    style.map("TCombobox",
+              fieldbackground=[("readonly", accent), ("disabled", "#2d2d2d")],
+              background=[("active", _HOVER), ("pressed", _HOVER)],
+              foreground=disabled_fg,
+              arrowcolor=disabled_fg)
+
+    # Style the combobox dropdown listbox
+    for option, value in (("Background", accent), ("Foreground", fg),
+                          ("selectBackground", hl), ("selectForeground", "white")):
+        root.option_add(f"*TCombobox*Listbox*{option}", value)
+
+    # Scrollbar styling, same for both orientations
+    scrollbar_map = [("active", _HOVER), ("pressed", "#555555")]
+    for name in ("Vertical.TScrollbar", "Horizontal.TScrollbar"):
+        style.configure(name, background=accent, troughcolor=bg, bordercolor=bg, arrowcolor=fg, borderwidth=0)
+        style.map(name, background=scrollbar_map)
+
+    # Progressbar styling
+    style.configure("TProgressbar", background=hl, troughcolor=accent, bordercolor=accent)
+
+    # LabelFrame styling
+    style.configure("TLabelframe", background=bg, foreground=fg, bordercolor=accent)
+    style.configure("TLabelframe.Label", background=bg, foreground=fg)
+
 
 class ESPFileBrowser(tk.Tk):
+    SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+    CONSOLE_LINES = 5000
+
     def __init__(self):
         super().__init__()
         self.title("ESP32 eMMC File Manager")
         self.geometry("1200x800")
         self.ser = None
+        self._serial_lock = threading.RLock()  # Held for a whole command/response transaction
         self.current_path = "/"
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_pending = False
+        self._refresh_force = False  # A pending refresh must bypass the caches
+        self._storage_checked = 0.0  # time.monotonic() of the last STORAGE query
+        self._needs_drain = False  # Set when a transaction may have left stray bytes behind
+        self._seq = 0  # Last "#n" tag put in front of a command
+        self._has_seq = None  # Whether the firmware echoes command tags (probed on connect)
+        self._pending_tags = collections.deque()  # Tags sent but not yet matched to a reply
+        self._rx = bytearray()  # Bytes read past the end of the last reply, consumed first by the next read
+        self._has_delete_many = None  # Unknown until the firmware answers (or ignores) DELETE_MANY
+        self.ui_q = queue.Queue()  # UI work posted by worker threads, applied by _pump
+        self._log_buf = collections.deque()  # Console lines waiting for flush_log
+        self._dir_cache = {}  # path -> (firmware generation, pre-formatted tree rows)
+        self._has_stat = None  # Unknown until the firmware answers (or ignores) STAT
+        self._use_sendfile = hasattr(os, "sendfile")  # Cleared if the port refuses it
+        self._shown_listing = None  # (path, rows) currently in the tree
         
         # Set icon if available (PyInstaller friendly)
         try:
@@ -46,83 +133,18 @@ class ESPFileBrowser(tk.Tk):
             )
         except Exception:
             pass  # Silently fail on non-Windows or older Windows versions
+
+        # Windows rounds waits up to its ~15.6 ms scheduler tick; request 1 ms so
+        # the short serial read timeouts actually return at line-arrival time
+        self._timer_period = False  # Whether timeBeginPeriod(1) needs undoing on close
+        try:
+            ctypes.windll.winmm.timeBeginPeriod(1)
+            self._timer_period = True
+        except Exception:
+            pass  # Not on Windows
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
         
-        # Configure ttk styles for dark theme
-        style = ttk.Style()
-        style.theme_use('clam')
-        
-        # Treeview styling
-        style.configure("Treeview",
-                        background=self.accent_color,
-                        foreground=self.fg_color,
-                        fieldbackground=self.accent_color,
-                        borderwidth=0)
-        style.configure("Treeview.Heading",
-                        background="#2d2d2d",
-                        foreground=self.fg_color,
-                        borderwidth=0,
-                        relief="flat")
-        style.map("Treeview",
-                  background=[("selected", self.highlight_color)],
-                  foreground=[("selected", "white")])
-        style.map("Treeview.Heading",
-                  background=[("active", "#4a4a4a")])
-        
-        # Combobox styling (including dropdown)
-        style.configure("TCombobox",
-                        fieldbackground=self.accent_color,
-                        background=self.accent_color,
-                        foreground=self.fg_color,
-                        arrowcolor=self.fg_color,
-                        bordercolor=self.accent_color,
-                        lightcolor=self.accent_color,
-                        darkcolor=self.accent_color)
-        style.map("TCombobox",
-                  fieldbackground=[("readonly", self.accent_color), ("disabled", "#2d2d2d")],
-                  background=[("active", "#4a4a4a"), ("pressed", "#4a4a4a")],
-                  foreground=[("disabled", "#808080")],
-                  arrowcolor=[("disabled", "#808080")])
-        
-        # Style the combobox dropdown listbox
-        self.option_add("*TCombobox*Listbox*Background", self.accent_color)
-        self.option_add("*TCombobox*Listbox*Foreground", self.fg_color)
-        self.option_add("*TCombobox*Listbox*selectBackground", self.highlight_color)
-        self.option_add("*TCombobox*Listbox*selectForeground", "white")
-        
-        # Scrollbar styling
-        style.configure("Vertical.TScrollbar",
-                        background=self.accent_color,
-                        troughcolor=self.bg_color,
-                        bordercolor=self.bg_color,
-                        arrowcolor=self.fg_color,
-                        borderwidth=0)
-        style.map("Vertical.TScrollbar",
-                  background=[("active", "#4a4a4a"), ("pressed", "#555555")])
-        
-        # Horizontal scrollbar
-        style.configure("Horizontal.TScrollbar",
-                        background=self.accent_color,
-                        troughcolor=self.bg_color,
-                        bordercolor=self.bg_color,
-                        arrowcolor=self.fg_color,
-                        borderwidth=0)
-        style.map("Horizontal.TScrollbar",
-                  background=[("active", "#4a4a4a"), ("pressed", "#555555")])
-        
-        # Progressbar styling
-        style.configure("TProgressbar",
-                        background=self.highlight_color,
-                        troughcolor=self.accent_color,
-                        bordercolor=self.accent_color)
-        
-        # LabelFrame styling
-        style.configure("TLabelframe",
-                        background=self.bg_color,
-                        foreground=self.fg_color,
-                        bordercolor=self.accent_color)
-        style.configure("TLabelframe.Label",
-                        background=self.bg_color,
-                        foreground=self.fg_color)
+        _install_dark_theme(self, self.accent_color, self.fg_color, self.bg_color, self.highlight_color)
 
         # === Connection Bar ===
         top = tk.Frame(self, bg=self.bg_color)
@@ -131,7 +153,7 @@ class ESPFileBrowser(tk.Tk):
         self.port_combo = ttk.Combobox(top, values=self.get_ports(), width=15)
         self.port_combo.pack(side=tk.LEFT, padx=5)
         tk.Button(top, text="Refresh", command=self.refresh_ports,
-                  bg=self.accent_color, fg=self.fg_color, activebackground="#4a4a4a",
+                  bg=self.accent_color, fg=self.fg_color, activebackground=_HOVER,
                   activeforeground="white", relief=tk.FLAT, padx=8, pady=2).pack(side=tk.LEFT)
 
         tk.Label(top, text="Baud:", bg=self.bg_color, fg=self.fg_color).pack(side=tk.LEFT, padx=(30,5))
@@ -159,14 +181,14 @@ class ESPFileBrowser(tk.Tk):
         # === Toolbar ===
         toolbar = tk.Frame(self, bg=self.bg_color)
         toolbar.pack(fill=tk.X, pady=5)
-        btn_style = {"bg": self.accent_color, "fg": self.fg_color, "activebackground": "#4a4a4a",
+        btn_style = {"bg": self.accent_color, "fg": self.fg_color, "activebackground": _HOVER,
                      "activeforeground": "white", "relief": tk.FLAT, "padx": 10, "pady": 3}
         tk.Button(toolbar, text="New Folder", command=self.new_folder, **btn_style).pack(side=tk.LEFT, padx=5)
         tk.Button(toolbar, text="Upload", command=self.upload, **btn_style).pack(side=tk.LEFT, padx=5)
         tk.Button(toolbar, text="Download", command=self.download_selected, **btn_style).pack(side=tk.LEFT, padx=5)
         tk.Button(toolbar, text="Delete", command=self.delete_selected, **btn_style).pack(side=tk.LEFT, padx=5)
         tk.Button(toolbar, text="Rename", command=self.rename_selected, **btn_style).pack(side=tk.LEFT, padx=5)
-        tk.Button(toolbar, text="Refresh", command=self.refresh, **btn_style).pack(side=tk.LEFT, padx=20)
+        tk.Button(toolbar, text="Refresh", command=lambda: self.refresh(force=True), **btn_style).pack(side=tk.LEFT, padx=20)
         tk.Button(toolbar, text="Up", command=self.go_up, **btn_style).pack(side=tk.RIGHT, padx=5)
 
         # === Treeview ===
@@ -181,6 +203,7 @@ class ESPFileBrowser(tk.Tk):
         vsb.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.configure(yscrollcommand=vsb.set)
         self.tree.bind("<Double-1>", self.on_double_click)
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
 
         # === Console ===
         console_frame = tk.LabelFrame(self, text="Serial Console", bg=self.bg_color, fg=self.fg_color,
@@ -191,12 +214,79 @@ class ESPFileBrowser(tk.Tk):
                                                   insertbackground='white')
         self.console.pack(fill=tk.X, padx=5, pady=5)
 
+        self.after(16, self._pump)
+        self.after(100, self._periodic_flush)
+
+    def _on_close(self):
+        """Undo the timer resolution request, then close the window"""
+        if self._timer_period:
+            try:
+                ctypes.windll.winmm.timeEndPeriod(1)
+            except Exception:
+                pass
+        self.destroy()
+
     def log(self, text):
+        """Thread-safe: buffer text for the console until the next flush_log"""
+        self._log_buf.append(text)
+
+    def flush_log(self):
+        """Main thread: write all buffered console lines with a single insert"""
+        if not self._log_buf:
+            return
+        lines = [self._log_buf.popleft() for _ in range(len(self._log_buf))]
         self.console.config(state='normal')
-        self.console.insert(tk.END, text + "\n")
+        self.console.insert(tk.END, "\n".join(lines) + "\n")
+        # Keep only the newest CONSOLE_LINES lines so long sessions stay cheap to draw
+        # (the text ends with a newline, so "end-1c" sits on an empty last line)
+        excess = int(self.console.index("end-1c").split(".")[0]) - 1 - self.CONSOLE_LINES
+        if excess > 0:
+            self.console.delete("1.0", f"{excess + 1}.0")
         self.console.see(tk.END)
         self.console.config(state='disabled')
 
+    def _periodic_flush(self):
+        self.flush_log()
+        self.after(100, self._periodic_flush)
+
+    def ui_call(self, fn, *args, **kwargs):
+        """Thread-safe: run fn on the Tk main thread"""
+        self.ui_q.put((fn, args, kwargs))
+
+    def _pump(self):
+        """Main thread: run calls queued by worker threads, ~60 times per second"""
+        try:
+            while True:
+                try:
+                    fn, fargs, fkwargs = self.ui_q.get_nowait()
+                except queue.Empty:
+                    break
+                self.flush_log()  # Console output logged before the call shows first
+                fn(*fargs, **fkwargs)
+        finally:
+            self.after(16, self._pump)
+
+    def _tick_progress(self, win, pb, pv, lv, state):
+        """
+        Main thread: redraw a transfer's progress from the counters its worker
+        updates (~30 Hz), and close the window once the worker marks it done.
+        The bar and label are bound to pv/lv, so a redraw is two variable sets.
+        """
+        if not win.winfo_exists():
+            return
+        if state["done"]:
+            win.destroy()
+            return
+        sent, total = state["sent"], state["total"]
+        if total and sent != state.get("drawn"):
+            if total != state.get("maximum"):
+                pb.config(maximum=total)  # Once, when the size becomes known
+                state["maximum"] = total
+            pv.set(sent)
+            lv.set(f"{self.human_size(sent)} / {self.human_size(total)}")
+            state["drawn"] = sent
+        self.after(33, self._tick_progress, win, pb, pv, lv, state)
+
     def get_ports(self):
         return [p.device for p in serial.tools.list_ports.comports()]
 
@@ -210,13 +300,39 @@ class ESPFileBrowser(tk.Tk):
             return
         try:
             baud = int(self.baud_combo.get())
-            self.ser = serial.Serial(port, baud, timeout=1, write_timeout=5)
-            time.sleep(1.2)
-            self.ser.reset_input_buffer()
-            self.log(f"Connected to {port} @ {baud:,} baud")
-            self.after(50, self.refresh)  # Ultra-fast refresh
-        except Exception as e:
-            messagebox.showerror("Connection Failed", str(e))
+        except ValueError:
+            messagebox.showerror("Connection Failed", "Invalid baud rate")
+            return
+
+        def run():
+            # Opening the port resets the board; wait for it off the UI thread
+            try:
+                with self._serial_lock:
+                    ser = serial.Serial(port, baud, timeout=1, write_timeout=5)
+                    if hasattr(ser, "set_buffer_size"):
+                        # Windows only: the default driver queue (~4 KB) overflows
+                        # during GETDATA bursts at high baud rates
+                        try:
+                            ser.set_buffer_size(rx_size=1 << 20, tx_size=1 << 18)
+                        except Exception as e:
+                            self.log(f"Could not enlarge serial buffers: {e}")
+                    time.sleep(1.2)
+                    ser.reset_input_buffer()
+                    self._needs_drain = False
+                    self._has_delete_many = None
+                    self._has_stat = None
+                    self._dir_cache.clear()
+                    self._storage_checked = 0.0
+                    self._pending_tags.clear()
+                    self._rx.clear()
+                    self.ser = ser
+                    self._has_seq = self._probe_seq()
+                self.log(f"Connected to {port} @ {baud:,} baud")
+                self.refresh()
+            except Exception as e:
+                self.ui_call(messagebox.showerror, "Connection Failed", str(e))
+
+        threading.Thread(target=run, daemon=True).start()
 
     def read_protocol_response(self, timeout=10, *expected_keywords):
         """
@@ -224,15 +340,16 @@ class ESPFileBrowser(tk.Tk):
         until a line starting with one of the expected keywords is found.
         """
         deadline = time.time() + timeout
-        # Use a short timeout for readline so we can check the deadline frequently
+        # Use a short timeout per line so we can check the deadline frequently
         # but long enough to capture full lines without aggressive CPU spinning
         old_timeout = self.ser.timeout
         self.ser.timeout = 0.5 
         
         try:
+            self._await_tag(timeout)
             while time.time() < deadline:
                 try:
-                    line = self.ser.readline().decode(errors="replace").strip()
+                    line = self._read_until(b"\n").decode(errors="replace").strip()
                 except Exception:
                     continue
                 
@@ -246,321 +363,860 @@ class ESPFileBrowser(tk.Tk):
         finally:
             self.ser.timeout = old_timeout
             
+        self._needs_drain = True
         raise TimeoutError(f"Timed out waiting for one of: {expected_keywords}")
 
     def disconnect(self):
         """Close the serial connection and reset the UI state"""
-        if self.ser:
-            try:
-                self.ser.close()
-                self.log("Disconnected from serial port")
-            except Exception as e:
-                self.log(f"Error disconnecting: {e}")
-            finally:
-                self.ser = None
+        def run():
+            # Wait for any running transaction to finish before closing the port under it
+            with self._serial_lock:
+                if self.ser:
+                    try:
+                        self.ser.close()
+                        self.log("Disconnected from serial port")
+                    except Exception as e:
+                        self.log(f"Error disconnecting: {e}")
+                    finally:
+                        self.ser = None
+                # Forget what the last board told us, as connect() does for the next one
+                self._needs_drain = False
+                self._has_seq = None
+                self._has_delete_many = None
+                self._has_stat = None
+                self._dir_cache.clear()
+                self._storage_checked = 0.0
+                self._pending_tags.clear()
+                self._rx.clear()
+            self.ui_call(self._reset_view)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _reset_view(self):
         self.tree.delete(*self.tree.get_children())
+        self._shown_listing = None
         self.storage_label.config(text="Storage: Not connected")
         self.current_path = "/"
         self.path_label.config(text="/")
 
+    def _drain(self):
+        """Discard leftovers of an incomplete transaction before starting a new one"""
+        self.ser.reset_input_buffer()
+        self._rx.clear()
+        self._pending_tags.clear()
+        self._needs_drain = False
+
+    def _tag(self, cmd):
+        """Prefix cmd with the next "#n" tag if the firmware echoes them"""
+        if not self._has_seq:
+            return cmd
+        self._seq += 1
+        tag = f"#{self._seq}"
+        self._pending_tags.append(tag)
+        return f"{tag} {cmd}"
+
+    def _probe_seq(self):
+        """Send one tagged STAT; firmware that doesn't know tags ignores the whole line"""
+        self._seq += 1
+        tag = f"#{self._seq}"
+        self.ser.write(f"{tag} STAT /\n".encode())
+        self.log(f"→ {tag} STAT /")
+        return tag in self.read_response(0.5)
+
+    def _await_tag(self, timeout):
+        """
+        Consume input up to the echo of the oldest outstanding command tag, dropping
+        whatever an earlier, abandoned command left behind (e.g. a late DONE).
+        """
+        if not self._pending_tags:
+            return
+        tag = self._pending_tags.popleft()
+        marker = tag.encode() + b"\r\n"
+        old_timeout = self.ser.timeout
+        self.ser.timeout = timeout
+        try:
+            while True:
+                data = self._read_until(marker)
+                if not data.endswith(marker):
+                    self._needs_drain = True
+                    raise TimeoutError(f"No reply to {tag}")
+                # Only a whole line counts ("#1" must not match the end of "#21")
+                if len(data) == len(marker) or data[-len(marker) - 1] == 0x0A:
+                    return
+        finally:
+            self.ser.timeout = old_timeout
+
+    def _read_until(self, terminator, idle_timeout=None):
+        """
+        ser.read_until without the byte-at-a-time reads: take everything that has
+        arrived in one call, and keep bytes past the terminator in self._rx for the
+        next read. Waits up to ser.timeout for data to start; once it has, gives up
+        after idle_timeout of silence (ser.timeout if None) and returns whatever
+        arrived without the terminator.
+        """
+        buf = self._rx
+        start = 0
+        old_timeout = self.ser.timeout
+        try:
+            while True:
+                i = buf.find(terminator, start)
+                if i >= 0:
+                    end = i + len(terminator)
+                    data = bytes(buf[:end])
+                    del buf[:end]
+                    return data
+                start = max(0, len(buf) - len(terminator) + 1)
+                if buf and idle_timeout is not None and self.ser.timeout != idle_timeout:
+                    self.ser.timeout = idle_timeout
+                chunk = self.ser.read(max(1, self.ser.in_waiting))
+                if not chunk:
+                    data = bytes(buf)
+                    buf.clear()
+                    return data
+                buf += chunk
+        finally:
+            if self.ser.timeout != old_timeout:
+                self.ser.timeout = old_timeout
+
+    def _take_buffered(self, n):
+        """Up to n bytes already read ahead into self._rx"""
+        data = bytes(self._rx[:n])
+        del self._rx[:n]
+        return data
+
+    def _read(self, n):
+        """ser.read(n) that hands out read-ahead bytes first"""
+        data = self._take_buffered(n)
+        if len(data) < n:
+            data += self.ser.read(n - len(data))
+        return data
+
     def send(self, cmd):
         if not self.ser: return
-        self.ser.reset_input_buffer()
+        if self._needs_drain:
+            self._drain()
+        cmd = self._tag(cmd)
         self.ser.write((cmd + "\n").encode())
         self.log(f"→ {cmd}")
 
-    def read_response(self, timeout=1.0):
-        """Lightning-fast response reader"""
-        lines = []
-        start = time.time()
-        while time.time() - start < timeout:
-            if self.ser.in_waiting > 0:
-                line = self.ser.readline().decode(errors='ignore').strip()
-                if line:
-                    lines.append(line)
-                    self.log(line)
-                if line == "DONE":
-                    return lines
-            else:
-                time.sleep(0.001)
+    def send_batch(self, cmds):
+        """Write several commands in one transfer; the caller then reads one response per command"""
+        if not self.ser: return
+        if self._needs_drain:
+            self._drain()
+        cmds = [self._tag(cmd) for cmd in cmds]
+        self.ser.write(("\n".join(cmds) + "\n").encode())
+        self.log("\n".join(f"→ {cmd}" for cmd in cmds))
+
+    def read_response(self, initial_timeout=1.0, inter_char_timeout=0.05):
+        """
+        Lightning-fast response reader.
+        Reads line by line through _read_until up to the DONE line. The reply
+        may take up to initial_timeout to start; once it is arriving, reading
+        stops at DONE or as soon as the link goes quiet for inter_char_timeout.
+        Anything before the echo of the command's tag is skipped.
+        """
+        try:
+            self._await_tag(initial_timeout)
+        except TimeoutError:
+            return []
+        buf = bytearray()
+        old_timeout = self.ser.timeout
+        self.ser.timeout = initial_timeout
+        try:
+            while True:
+                line = self._read_until(b"\n", inter_char_timeout)
+                buf += line
+                if not line.endswith(b"\n"):
+                    self._needs_drain = True  # Went quiet before DONE
+                    break
+                # DONE counts only as a whole line (not e.g. a file named "UNDONE"),
+                # ended by either \r\n or \n
+                if line.rstrip(b"\r\n") == b"DONE":
+                    break
+                self.ser.timeout = inter_char_timeout
+        finally:
+            self.ser.timeout = old_timeout
+        # Decode the whole reply once, then split it into lines
+        lines = [line.strip() for line in buf.decode(errors='ignore').splitlines()]
+        lines = [line for line in lines if line]
+        if lines:
+            self.log("\n".join(lines))  # One console update per response
         return lines
 
     def human_size(self, bytes_val):
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if bytes_val < 1024.0:
-                return f"{bytes_val:,.2f} {unit}"
-            bytes_val /= 1024.0
-        return f"{bytes_val:,.2f} TB"
+        # Pick the unit straight from the bit length: every 10 bits is one step of 1024
+        idx = min((bytes_val.bit_length() - 1) // 10, 4) if bytes_val > 0 else 0
+        return f"{bytes_val / (1 << (idx * 10)):,.2f} {self.SIZE_UNITS[idx]}"
+
+    def parse_list_line(self, line):
+        """Split a LIST line into (kind, name, size); returns None for anything else"""
+        m = _LIST_RE.match(line)
+        if not m:
+            return None
+        if m.group("dir") is not None:
+            return "DIR", m.group("dir").rstrip(), None
+        return "FILE", m.group("file"), int(m.group("size"))
 
-    def refresh(self):
+    def refresh(self, force=False):
+        """
+        Show the current directory. A cached listing is drawn immediately and then
+        revalidated in the background; force=True re-lists it and re-reads storage.
+        """
         if not self.ser: return
-        self.tree.delete(*self.tree.get_children())
-        self.path_label.config(text=self.current_path or "/")
+        cached = None if force else self._dir_cache.get(self.current_path)
+        if cached:
+            self.ui_call(self._refresh_ui, self.current_path, None, cached[1])
+        # Serial I/O runs on a worker; a refresh requested meanwhile is re-run once it finishes
+        with self._refresh_lock:
+            self._refresh_force = self._refresh_force or force
+            if self._refreshing:
+                self._refresh_pending = True
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_io, daemon=True).start()
+
+    def _refresh_io(self):
+        """Worker: query storage and list the current directory, then hand off to the UI thread"""
+        while True:
+            path = self.current_path
+            with self._refresh_lock:
+                force, self._refresh_force = self._refresh_force, False
+            try:
+                with self._serial_lock:
+                    # Storage (fast), at most every 2 s unless forced
+                    storage = None
+                    if force or time.monotonic() - self._storage_checked > 2.0:
+                        storage = self._query_storage()
+                        self._storage_checked = time.monotonic()
+
+                    rows = self._listing(path, force)
+                self.ui_call(self._refresh_ui, path, storage, rows, force)
+            except Exception as e:
+                self.log(f"Refresh failed: {e}")
+
+            with self._refresh_lock:
+                if not self._refresh_pending:
+                    self._refreshing = False
+                    return
+                self._refresh_pending = False
 
-        # Storage (fast)
+    def _query_storage(self):
+        """(total, free) bytes from STORAGE, or None if the reply could not be read"""
         self.send("STORAGE")
-        lines = self.read_response(0.5)
-        total = free = 0
-        for line in lines:
-            if "TOTAL:" in line:
-                parts = line.split(" FREE:")
-                total = int(parts[0].split(":")[1])
-                free = int(parts[1])
-                self.storage_label.config(text=f"Total: {self.human_size(total)} | Free: {self.human_size(free)}")
-
-        # List directory (fast)
-        self.send(f"LIST {self.current_path}")
-        lines = self.read_response(1.0)
+        if not self._has_seq:
+            # Untagged STORAGE is answered in text
+            for line in self.read_response(0.5):
+                m = _STORAGE_RE.search(line)
+                if m:
+                    return int(m.group(1)), int(m.group(2))
+            return None
+        # "S" + total and free as little-endian uint64, then a line break and DONE
+        try:
+            self._await_tag(0.5)
+        except TimeoutError:
+            return None
+        raw = self._read(17)
+        if len(raw) != 17 or raw[:1] != b"S":
+            self._needs_drain = True
+            return None
+        total, free = struct.unpack_from("<QQ", raw, 1)
+        self.log(f"TOTAL:{total} FREE:{free}")
+        self.read_response(0.5)
+        return total, free
+
+    def _listing(self, path, force=False):
+        """Rows of a directory, reused from the cache if nothing changed on the card since"""
+        gen = self._stat_generation(path)
+        cached = self._dir_cache.get(path)
+        if not force and gen is not None and cached and cached[0] == gen:
+            return cached[1]
+        rows = self._list_rows(path)
+        self._dir_cache[path] = (gen, rows)
+        return rows
+
+    def _list_rows(self, path):
+        """LIST a directory and return its pre-formatted (text, values) tree rows"""
+        self.send(f"LIST {_quote(path)}")
+        lines = self.read_response(1.0, 0.5)  # Entries are produced at SD speed
+        # Pre-format every row so the UI thread only has to insert them
+        rows = []
         for line in lines:
-            if line.startswith("DIR :"):
-                name = line[6:].strip()
-                self.tree.insert("", "end", text=" " + name, values=("",))
-            elif line.startswith("FILE :"):
-                parts = line.split(" SIZE : ")
-                name = parts[0][7:].strip()
-                size = int(parts[1])
-                self.tree.insert("", "end", text=" " + name, values=(self.human_size(size),))
+            entry = self.parse_list_line(line)
+            if not entry:
+                continue
+            kind, name, size = entry
+            if kind == "DIR":
+                rows.append((" " + name, ("",)))
+            else:
+                rows.append((" " + name, (self.human_size(size),)))
+        return rows
+
+    def _stat_generation(self, path):
+        """Firmware change counter from STAT, or None if the firmware has no STAT"""
+        if self._has_stat is False:
+            return None
+        self.send(f"STAT {_quote(path)}")
+        for line in self.read_response(0.3):
+            if line.startswith("GEN:"):
+                self._has_stat = True
+                return int(line[4:])
+        if self._has_stat is None:
+            self._has_stat = False  # Older firmware ignores the command
+        return None
+
+    def invalidate_cache(self, path, subtree=False):
+        """Forget the cached listing of a directory (and optionally everything below it)"""
+        self._storage_checked = 0.0  # Contents changed, so free space likely did too
+        prefix = path.rstrip("/") + "/"
+        self._dir_cache.pop(prefix, None)
+        if subtree:
+            # Snapshot the keys: a worker may be adding listings meanwhile
+            for key in list(self._dir_cache):
+                if key.startswith(prefix):
+                    self._dir_cache.pop(key, None)
+
+    def _refresh_ui(self, path, storage, rows, force=False):
+        """Main thread: repopulate the tree from a finished refresh"""
+        if path != self.current_path:
+            return  # Navigated away meanwhile; the pending refresh will follow
+        self.path_label.config(text=path or "/")
+        if storage:
+            total, free = storage
+            self.storage_label.config(text=f"Total: {self.human_size(total)} | Free: {self.human_size(free)}")
+        if (path, rows) == self._shown_listing:
+            # Same listing already on screen; leave the tree untouched, but on a
+            # forced refresh re-list the folders that were expanded below it
+            if force:
+                for iid in self.tree.get_children():
+                    if self.tree.item(iid, "values") == ("",) and "needs_load" not in self.tree.item(iid, "tags"):
+                        self.invalidate_cache(iid, subtree=True)
+                        self._reload_node(iid)
+            return
+        self._shown_listing = (path, rows)
+        # Item ids are remote paths, so the old rows must go before the new ones exist.
+        # Build the rows under a detached holder item, then swap them in with one call.
+        self.tree.delete(*self.tree.get_children())
+        holder = self.tree.insert("", "end")
+        self.tree.detach(holder)
+        self._insert_rows(holder, path, rows)
+        self.tree.set_children("", *self.tree.get_children(holder))
+        self.tree.delete(holder)
+
+    def _insert_rows(self, parent, path, rows):
+        """
+        Main thread: insert a directory's rows under parent with their remote paths as
+        item ids. Folders get a placeholder child so Tk draws an expand arrow; their
+        contents are listed when first opened.
+        """
+        for text, values in rows:
+            iid = posixpath.join(path, text[1:])
+            if values == ("",):
+                self.tree.insert(parent, "end", iid=iid, text=text, values=values, tags=("needs_load",))
+                self.tree.insert(iid, "end", text=" Loading...")
+            else:
+                self.tree.insert(parent, "end", iid=iid, text=text, values=values)
+
+    def on_tree_open(self, event):
+        """List a folder the first time it is expanded in place"""
+        iid = self.tree.focus()
+        if not iid or "needs_load" not in self.tree.item(iid, "tags"):
+            return
+        self.tree.item(iid, tags=())
+        self.load_node(iid)
+
+    def load_node(self, iid):
+        """List the folder shown as iid on a worker and fill in its children"""
+        path = iid + "/"
+
+        def run():
+            try:
+                with self._serial_lock:
+                    rows = self._listing(path)
+                self.ui_call(self._fill_node, iid, rows)
+            except Exception as e:
+                self.log(f"Listing {path} failed: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fill_node(self, iid, rows):
+        """Main thread: replace an expanded folder's children with its listing"""
+        if not self.tree.exists(iid):
+            return  # Tree was rebuilt meanwhile
+        self.tree.delete(*self.tree.get_children(iid))
+        self._insert_rows(iid, iid, rows)
+
+    def refresh_dir(self, path):
+        """Thread-safe: re-list path wherever it is shown (current directory or an expanded folder)"""
+        if path == self.current_path:
+            self.refresh()
+        else:
+            self.ui_call(self._reload_node, path.rstrip("/"))
+
+    def _reload_node(self, iid):
+        """Main thread: reload an open folder now, or have a closed one reload when next opened"""
+        if not self.tree.exists(iid):
+            return
+        if self.tree.item(iid, "open"):
+            self.load_node(iid)
+        else:
+            self.tree.delete(*self.tree.get_children(iid))
+            self.tree.insert(iid, "end", text=" Loading...")
+            self.tree.item(iid, tags=("needs_load",))
+
+    def _selected(self):
+        """(remote path, name, is_dir) of the selected row, or None"""
+        sel = self.tree.selection()
+        if not sel or not sel[0].startswith("/"):
+            return None  # Nothing selected, or a "Loading..." placeholder
+        iid = sel[0]
+        return iid, self.tree.item(iid, "text").strip(), self.tree.item(iid, "values") == ("",)
 
     def on_double_click(self, event):
-        item = self.tree.selection()
-        if not item: return
-        name = self.tree.item(item[0], "text").strip()
-        if self.tree.item(item[0], "values") == ("",):
-            self.current_path = (self.current_path.rstrip("/") + "/" + name + "/").replace("//", "/")
+        selected = self._selected()
+        if not selected: return
+        path, name, is_dir = selected
+        if is_dir:
+            self.current_path = posixpath.join(path, "")
             self.refresh()
+            return "break"  # Navigating replaces the tree; skip ttk's expand-on-double-click
 
     def go_up(self):
         if self.current_path != "/":
-            self.current_path = os.path.dirname(self.current_path.rstrip("/")) + "/"
-            if self.current_path == "/": self.current_path = "/"
+            self.current_path = posixpath.join(posixpath.dirname(self.current_path.rstrip("/")), "")
             self.refresh()
 
     def new_folder(self):
         name = simpledialog.askstring("New Folder", "Name:")
+        if name and "/" in name:
+            messagebox.showerror("Error", "Folder names cannot contain '/'")
+            return
         if name:
-            path = self.current_path.rstrip("/") + "/" + name
-            self.send(f"CREATE_DIR {path}")
-            self.read_response(0.5)
-            self.refresh()
+            parent = self.current_path
+            path = posixpath.join(self.current_path, name)
+
+            def run():
+                try:
+                    with self._serial_lock:
+                        self.send(f"CREATE_DIR {_quote(path)}")
+                        self.read_response(0.5)
+                    self.invalidate_cache(parent)
+                    self.refresh()
+                except Exception as e:
+                    self._needs_drain = True
+                    self.log(f"Create folder failed: {e}")
+                    self.ui_call(messagebox.showerror, "Error", f"Create folder failed:\n{e}")
+
+            threading.Thread(target=run, daemon=True).start()
 
     def upload(self):
         local = filedialog.askopenfilename()
         if not local: return
         name = os.path.basename(local)
         size = os.path.getsize(local)
-        remote_path = f'"{self.current_path.rstrip("/")}/{name}"'
+        remote_dir = self.current_path
+        remote_path = _quote(posixpath.join(self.current_path, name))
 
         win = tk.Toplevel(self)
         win.title("Uploading...")
         win.geometry("420x130")
         tk.Label(win, text="Uploading:").pack(pady=5)
         tk.Label(win, text=name, fg="blue").pack()
-        pb = ttk.Progressbar(win, length=380, mode="determinate")
+        pv = tk.IntVar(win, value=0)
+        lv = tk.StringVar(win, value="0 B / 0 B")
+        pb = ttk.Progressbar(win, length=380, mode="determinate", variable=pv)
         pb.pack(pady=10)
-        pb['maximum'] = size
-        lbl = tk.Label(win, text="0 B / 0 B")
-        lbl.pack()
+        tk.Label(win, textvariable=lv).pack()
+        # Worker updates the counters; _tick_progress draws them on the main thread
+        state = {"sent": 0, "total": size, "done": False}
+        self._tick_progress(win, pb, pv, lv, state)
 
         def run():
             try:
-                # 1. Send Command
-                self.send(f"PUTFILE {remote_path} {size}")
+                with self._serial_lock:
+                    # 1. Send Command
+                    self.send(f"PUTFILE {remote_path} {size}")
                 
-                # 2. Wait for READY {chunk_size} using robust reader
-                try:
-                    resp = self.read_protocol_response(5.0, "READY", "ERROR")
-                except TimeoutError:
-                    raise Exception("Timeout waiting for READY response")
+                    # 2. Wait for READY {chunk_size} using robust reader
+                    try:
+                        resp = self.read_protocol_response(5.0, "READY", "ERROR")
+                    except TimeoutError:
+                        raise Exception("Timeout waiting for READY response")
                 
-                self.log(f"← {resp}")
+                    self.log(f"← {resp}")
                 
-                if resp.startswith("ERROR"):
-                     raise Exception(f"Device reported error: {resp}")
+                    if resp.startswith("ERROR"):
+                         raise Exception(f"Device reported error: {resp}")
 
-                if not resp.startswith("READY"):
-                   raise Exception(f"Protocol Error: Expected READY, got '{resp}'")
+                    if not resp.startswith("READY"):
+                       raise Exception(f"Protocol Error: Expected READY, got '{resp}'")
                 
-                try:
-                    chunk_size = int(resp.split()[1])
-                except (IndexError, ValueError):
-                    raise Exception(f"Protocol Error: Invalid chunk size in '{resp}'")
-
-                # 3. Send file in chunks
-                with open(local, "rb") as f:
-                    sent = 0
-                    while sent < size:
-                        chunk = f.read(chunk_size)
-                        if not chunk: break
-                        
-                        # Send the entire chunk as specified by the protocol
-                        self.log(f"Sending chunk of {len(chunk)} bytes (offset {sent})...")
-                        bytes_written = self.ser.write(chunk)
-                        self.ser.flush()
-                        self.log(f"Actually wrote {bytes_written} bytes")
-                        if bytes_written != len(chunk):
-                            raise Exception(f"Write failed: only {bytes_written}/{len(chunk)} bytes written")
-                        
+                    try:
+                        chunk_size = int(resp.split()[1])
+                    except (IndexError, ValueError):
+                        raise Exception(f"Protocol Error: Invalid chunk size in '{resp}'")
+
+                    # 3. Send file in chunks through one reusable buffer
+                    mv = memoryview(bytearray(chunk_size))
+                    with open(local, "rb") as f:
+                        sent = 0
+                        while sent < size:
+                            # Send the entire chunk as specified by the protocol
+                            n = self._send_file_chunk(f, sent, mv)
+                            if not n: break
+                            self.ser.flush()
                         
-                        sent += len(chunk)
-                        pb['value'] = sent
-                        lbl.config(text=f"{self.human_size(sent)} / {self.human_size(size)}")
-                        win.update_idletasks()
+                            sent += n
+                            state["sent"] = sent
                         
-                        # 4. Wait for acknowledgement (skip if this was the final chunk)
-                        if sent < size:
-                            self.log(f"Waiting for NEXT acknowledgement...")
-                            try:
-                                ack = self.read_protocol_response(10.0, "NEXT", "ERROR")
-                            except TimeoutError:
-                                 raise Exception(f"Timeout waiting for NEXT at offset {sent}")
+                            # 4. Wait for acknowledgement (skip if this was the final chunk)
+                            if sent < size:
+                                try:
+                                    ack = self.read_protocol_response(10.0, "NEXT", "ERROR")
+                                except TimeoutError:
+                                     raise Exception(f"Timeout waiting for NEXT at offset {sent}")
                                  
-                            if ack.startswith("ERROR"):
-                                raise Exception(f"Device reported error during upload: {ack}")
+                                if ack.startswith("ERROR"):
+                                    raise Exception(f"Device reported error during upload: {ack}")
 
-                            if ack != "NEXT":
-                                raise Exception(f"Protocol Error: Expected NEXT, got '{ack}' at offset {sent}")
+                                if ack != "NEXT":
+                                    raise Exception(f"Protocol Error: Expected NEXT, got '{ack}' at offset {sent}")
 
-                # 5. Read final status (OK/ERROR and DONE)
-                # We can use the helper here too to be safe against trailing debug logs
-                try:
-                    res = self.read_protocol_response(2.0, "OK", "ERROR")
-                    if res.startswith("ERROR"):
-                        raise Exception(f"Final status error: {res}")
+                    # 5. Read final status (OK/ERROR and DONE)
+                    # We can use the helper here too to be safe against trailing debug logs
+                    try:
+                        res = self.read_protocol_response(2.0, "OK", "ERROR")
+                        if res.startswith("ERROR"):
+                            raise Exception(f"Final status error: {res}")
                     
-                    done = self.read_protocol_response(2.0, "DONE")
-                except TimeoutError:
-                    self.log("Warning: Timed out waiting for final confirmation")
+                        self.read_protocol_response(2.0, "DONE")
+                    except TimeoutError:
+                        self.log("Warning: Timed out waiting for final confirmation")
 
+                self.invalidate_cache(remote_dir)
                 self.refresh()
-                messagebox.showinfo("Success", f"Uploaded:\n{name}")
+                self.ui_call(messagebox.showinfo, "Success", f"Uploaded:\n{name}")
             except Exception as e:
+                self._needs_drain = True
                 self.log(f"Upload failed: {e}")
-                messagebox.showerror("Error", f"Upload failed:\n{e}")
+                self.ui_call(messagebox.showerror, "Error", f"Upload failed:\n{e}")
             finally:
-                win.destroy()
+                state["done"] = True
 
         threading.Thread(target=run, daemon=True).start()
 
+    def _send_file_chunk(self, f, offset, mv):
+        """
+        Send up to len(mv) bytes of f starting at offset and return how many were sent.
+        Uses an in-kernel os.sendfile copy where the OS and port allow it, otherwise
+        reads into the reusable buffer mv and writes that.
+        """
+        done = 0
+        if self._use_sendfile:
+            try:
+                out_fd, in_fd = self.ser.fileno(), f.fileno()
+                while done < len(mv):
+                    try:
+                        n = os.sendfile(out_fd, in_fd, offset + done, len(mv) - done)
+                    except BlockingIOError:
+                        # pyserial opens the port non-blocking; wait until it drains
+                        _, writable, _ = select.select([], [out_fd], [], self.ser.write_timeout)
+                        if not writable:
+                            raise serial.SerialTimeoutException("Write timeout")
+                        continue
+                    if not n:
+                        break  # End of file
+                    done += n
+                return done
+            except serial.SerialTimeoutException:
+                raise  # The device stopped reading; buffered writes would stall as well
+            except OSError as e:
+                # e.g. no fileno() on Windows, or EINVAL for ttys on newer kernels
+                self._use_sendfile = False
+                self.log(f"sendfile unavailable ({e}), using buffered writes")
+
+        f.seek(offset + done)
+        n = f.readinto(mv[done:])
+        if not n:
+            return done
+        bytes_written = self.ser.write(mv[done:done + n])
+        if bytes_written != n:
+            raise Exception(f"Write failed: only {bytes_written}/{n} bytes written")
+        return done + n
+
     def download_selected(self):
-        sel = self.tree.selection()
-        if not sel:
+        selected = self._selected()
+        if not selected:
             return
-        name = self.tree.item(sel[0], "text").strip()
-        if self.tree.item(sel[0], "values") == ("",):   # it's a folder
+        path, name, is_dir = selected
+        if is_dir:
             return
 
         local_path = filedialog.asksaveasfilename(initialfile=name)
         if not local_path:
             return
 
-        remote_path = f'"{self.current_path.rstrip("/")}/{name}"'   # <-- QUOTED PATH
+        remote_path = _quote(path)
 
         win = tk.Toplevel(self)
         win.title("Downloading...")
         win.geometry("420x110")
         tk.Label(win, text=f"Downloading {name}").pack(pady=10)
-        pb = ttk.Progressbar(win, length=380, mode="determinate")
+        pv = tk.IntVar(win, value=0)
+        lv = tk.StringVar(win, value="Getting size...")
+        pb = ttk.Progressbar(win, length=380, mode="determinate", variable=pv)
         pb.pack(pady=10)
-        lbl = tk.Label(win, text="Getting size...")
-        lbl.pack()
+        tk.Label(win, textvariable=lv).pack()
+        # Worker updates the counters; _tick_progress draws them on the main thread
+        state = {"sent": 0, "total": 0, "done": False}
+        self._tick_progress(win, pb, pv, lv, state)
 
         def run():
+            started = False  # Whether local_path has been opened (and truncated) yet
             try:
-                # ---- GET SIZE ----
-                self.send(f"GETSIZE {remote_path}")
-                try:
-                    size_resp = self.read_protocol_response(2.0, "SIZE:", "ERROR")
-                except TimeoutError:
-                    messagebox.showerror("Error", "Timeout getting file size")
-                    win.destroy()
-                    return
-                    
-                if size_resp.startswith("ERROR"):
-                    messagebox.showerror("Error", "Failed to get file size")
-                    win.destroy()
-                    return
-                    
-                size = int(size_resp.split(":", 1)[1])
-                pb['maximum'] = size
-                lbl.config(text="0 B / 0 B")
-                
-                # Wait for DONE
-                try:
-                    self.read_protocol_response(1.0, "DONE")
-                except TimeoutError:
-                    pass  # Optional, continue anyway
-
-                # ---- GET DATA (binary) ----
-                self.send(f"GETDATA {remote_path}")
-                self.ser.reset_input_buffer()
-                data = b""
-                while len(data) < size:
-                    chunk = self.ser.read(min(32768, size - len(data)))
-                    if not chunk:
-                        break
-                    data += chunk
-                    pb['value'] = len(data)
-                    lbl.config(text=f"{self.human_size(len(data))} / {self.human_size(size)}")
-                    win.update_idletasks()
-
-                with open(local_path, "wb") as f:
-                    f.write(data)
-
-                messagebox.showinfo("Success", f"Downloaded {name}\n{self.human_size(size)}")
+                with self._serial_lock:
+                    if self._has_seq:
+                        # One round trip: 8-byte LE length, the data, 4-byte LE CRC-32
+                        self.send(f"GETDATA {remote_path}")
+                        self._await_tag(2.0)  # Binary reply follows the tag line
+                        hdr = self._read(8)
+                        if len(hdr) != 8:
+                            raise Exception("Timeout getting file size")
+                        if hdr == _GETDATA_ERROR:
+                            raise Exception("Failed to open file on device")
+                        size = int.from_bytes(hdr, "little")
+                    else:
+                        # Untagged (older firmware): ask for the size first; GETDATA then sends raw bytes
+                        self.send(f"GETSIZE {remote_path}")
+                        try:
+                            size_resp = self.read_protocol_response(2.0, "SIZE:", "ERROR")
+                        except TimeoutError:
+                            raise Exception("Timeout getting file size")
+                        if size_resp.startswith("ERROR"):
+                            raise Exception("Failed to get file size")
+                        size = int(size_resp.split(":", 1)[1])
+                        try:
+                            self.read_protocol_response(1.0, "DONE")
+                        except TimeoutError:
+                            pass  # Optional, continue anyway
+                        self.send(f"GETDATA {remote_path}")
+                    state["total"] = size
+
+                    # Stream straight to disk through one reusable 64 KB buffer.
+                    # Each read returns after at most 1 s with whatever arrived, so
+                    # progress keeps moving at low baud; only repeated empty reads
+                    # mean the device has stalled.
+                    mv = memoryview(bytearray(65536))
+                    received = 0
+                    crc = 0
+                    idle = 0  # Consecutive reads that returned nothing
+                    old_timeout = self.ser.timeout
+                    self.ser.timeout = 1.0
+                    try:
+                        with open(local_path, "wb") as f:
+                            started = True
+                            # Bind hot-loop callables to locals once
+                            readinto, write, crc32 = self.ser.readinto, f.write, zlib.crc32
+                            # Data that arrived together with the header is already buffered
+                            head = self._take_buffered(size)
+                            if head:
+                                write(head)
+                                crc = crc32(head)
+                                received = len(head)
+                                state["sent"] = received
+                            while received < size:
+                                n = readinto(mv[:min(65536, size - received)])
+                                if not n:
+                                    idle += 1
+                                    if idle >= 3:
+                                        break  # Nothing for 3 s
+                                    continue
+                                idle = 0
+                                block = mv[:n]
+                                write(block)
+                                crc = crc32(block, crc)  # Checksum while the data is hot
+                                received += n
+                                state["sent"] = received
+                        trailer = self._read(4) if self._has_seq else None
+                    finally:
+                        self.ser.timeout = old_timeout
+
+                    if received != size:
+                        self._needs_drain = True
+                        raise Exception(f"Download incomplete: received {received:,} of {size:,} bytes")
+
+                    if trailer is not None:
+                        if len(trailer) != 4:
+                            raise Exception("Timeout waiting for CRC")
+                        device_crc = int.from_bytes(trailer, "little")
+                    else:
+                        # Untagged GETDATA is followed by CRC:xxxxxxxx on firmware that has it
+                        try:
+                            crc_resp = self.read_protocol_response(1.0, "CRC:")
+                        except TimeoutError:
+                            self._needs_drain = False  # Nothing left unread
+                            device_crc = None
+                            self.log("No CRC from firmware, integrity not verified")
+                        else:
+                            device_crc = int(crc_resp[4:], 16)
+                    if device_crc is not None and device_crc != crc:
+                        raise Exception(f"CRC mismatch: device {device_crc:08X}, received {crc:08X}")
+
+                self.ui_call(messagebox.showinfo, "Success", f"Downloaded {name}\n{self.human_size(size)}")
             except Exception as e:
-                messagebox.showerror("Error", str(e))
+                self._needs_drain = True
+                if started:
+                    # The file was streamed to disk as it arrived; don't leave a partial copy
+                    try:
+                        os.remove(local_path)
+                    except OSError:
+                        pass
+                self.ui_call(messagebox.showerror, "Error", str(e))
             finally:
-                win.destroy()
+                state["done"] = True
 
         threading.Thread(target=run, daemon=True).start()
 
     def delete_recursive(self, path):
         """Delete folder and all contents recursively"""
-        self.send(f"LIST {path}")
-        lines = self.read_response(0.8)
-        for line in lines:
-            if line.startswith("DIR :"):
-                subdir = line[6:].strip()
-                self.delete_recursive(path.rstrip("/") + "/" + subdir)
-            elif line.startswith("FILE :"):
-                filename = line.split(" SIZE : ")[0][7:].strip()
-                current_dir = path.rstrip('"')
-                fullpath = f'{current_dir.rstrip("/")}/{filename}"'
-                self.send(f"DELETE {fullpath}")
-                self.read_response(0.3)
-
-        self.send(f"REMOVE_DIR {path}")
-        self.read_response(0.5)
+        # Walk the tree one level at a time, pipelining the LISTs of each level
+        files, dirs = [], []
+        level = [path]
+        while level:
+            dirs.extend(level)
+            below = []
+            for i in range(0, len(level), 16):
+                batch = level[i:i + 16]
+                self.send_batch([f"LIST {_quote(d)}" for d in batch])
+                for current in batch:
+                    for line in self.read_response(0.8, 0.5):
+                        entry = self.parse_list_line(line)
+                        if not entry:
+                            continue
+                        kind, name, _ = entry
+                        child = posixpath.join(current, name)
+                        if kind == "DIR":
+                            below.append(child)
+                        else:
+                            files.append(child)
+            level = below
+        dirs.reverse()  # Walked level by level, so reversed every folder follows its children
+
+        if self._delete_many(files + dirs):
+            return
+
+        # Firmware without DELETE_MANY: pipeline plain DELETE/REMOVE_DIR commands.
+        # The firmware runs them in order, so folders still go after their contents.
+        cmds = [f"DELETE {_quote(p)}" for p in files] + [f"REMOVE_DIR {_quote(p)}" for p in dirs]
+        for i in range(0, len(cmds), 16):
+            batch = cmds[i:i + 16]
+            self.send_batch(batch)
+            for _ in batch:
+                self.read_response(0.5)
+
+    def _delete_many(self, paths, batch_bytes=3584):
+        """
+        Delete paths in order with batched DELETE_MANY; returns False if the firmware lacks it.
+        Each batch of path lines stays under batch_bytes so it fits the firmware's 4 KB RX
+        buffer. Raises if a batch is not acknowledged or any path could not be removed.
+        """
+        if self._has_delete_many is False:
+            return False
+        batches, size = [[]], 0
+        for path in paths:
+            line = (path + "\n").encode()
+            if batches[-1] and size + len(line) > batch_bytes:
+                batches.append([])
+                size = 0
+            batches[-1].append(line)
+            size += len(line)
+
+        failed = []
+        for batch in batches:
+            if not batch:
+                continue
+            self.send(f"DELETE_MANY {len(batch)}")
+            self.ser.write(b"".join(batch))
+            lines = self.read_response(2.0, 2.0)
+            if not lines or lines[-1] != "DONE":
+                if self._has_delete_many is None:
+                    # Older firmware ignores the command and the path lines without replying
+                    self._has_delete_many = False
+                    return False
+                raise Exception("No DONE after DELETE_MANY")
+            self._has_delete_many = True
+            failed.extend(line[len("ERROR : "):] for line in lines if line.startswith("ERROR : "))
+        if failed:
+            raise Exception("Could not delete:\n" + "\n".join(failed[:10])
+                            + (f"\n... and {len(failed) - 10} more" if len(failed) > 10 else ""))
+        return True
 
     def delete_selected(self):
-        sel = self.tree.selection()
-        if not sel: return
-        name = self.tree.item(sel[0], "text").strip()
-        full_path = f'"{self.current_path.rstrip("/")}/{name}"'
-        is_dir = self.tree.item(sel[0], "values") == ("",)
+        selected = self._selected()
+        if not selected: return
+        path, name, is_dir = selected
+        parent = posixpath.join(posixpath.dirname(path), "")
+        full_path = _quote(path)
 
         if is_dir:
             if messagebox.askyesno("Delete Folder", f"Delete folder and ALL contents?\n\n{name}"):
                 win = tk.Toplevel(self); win.title("Deleting..."); tk.Label(win, text="Working...").pack(pady=20)
-                def run(): self.delete_recursive(full_path); self.after(100, self.refresh); win.destroy()
+                def run():
+                    try:
+                        with self._serial_lock:
+                            self.delete_recursive(path)
+                        self.invalidate_cache(path, subtree=True)
+                        self.invalidate_cache(parent)
+                        self.refresh_dir(parent)
+                    except Exception as e:
+                        self._needs_drain = True
+                        self.log(f"Delete failed: {e}")
+                        self.ui_call(messagebox.showerror, "Error", f"Delete failed:\n{e}")
+                    finally:
+                        self.ui_call(win.destroy)
                 threading.Thread(target=run, daemon=True).start()
         else:
             if messagebox.askyesno("Delete File", f"Delete {name}?"):
-                self.send(f"DELETE {full_path}")
-                self.read_response(0.5)
-                self.refresh()
+                def run():
+                    try:
+                        with self._serial_lock:
+                            self.send(f"DELETE {full_path}")
+                            self.read_response(0.5)
+                        self.invalidate_cache(parent)
+                        self.refresh_dir(parent)
+                    except Exception as e:
+                        self._needs_drain = True
+                        self.log(f"Delete failed: {e}")
+                        self.ui_call(messagebox.showerror, "Error", f"Delete failed:\n{e}")
+                threading.Thread(target=run, daemon=True).start()
 
     def rename_selected(self):
-        sel = self.tree.selection()
-        if not sel: return
-        old_name = self.tree.item(sel[0], "text").strip()
+        selected = self._selected()
+        if not selected: return
+        path, old_name, _ = selected
         new_name = simpledialog.askstring("Rename", "New name:", initialvalue=old_name)
+        if new_name and "/" in new_name:
+            messagebox.showerror("Error", "Names cannot contain '/'")
+            return
         if new_name and new_name != old_name:
-            old_path = f'"{self.current_path.rstrip("/")}/{old_name}"'
-            new_path = f'"{self.current_path.rstrip("/")}/{new_name}"'
-            self.send(f"RENAME {old_path} {new_path}")
-            self.read_response(0.5)
-            self.refresh()
+            parent = posixpath.join(posixpath.dirname(path), "")
+            old_path = _quote(path)
+            new_path = _quote(posixpath.join(parent, new_name))
+
+            def run():
+                try:
+                    with self._serial_lock:
+                        self.send(f"RENAME {old_path} {new_path}")
+                        self.read_response(0.5)
+                    self.invalidate_cache(path, subtree=True)
+                    self.invalidate_cache(parent)
+                    self.refresh_dir(parent)
+                except Exception as e:
+                    self._needs_drain = True
+                    self.log(f"Rename failed: {e}")
+                    self.ui_call(messagebox.showerror, "Error", f"Rename failed:\n{e}")
+
+            threading.Thread(target=run, daemon=True).start()
 
     def resource_path(self, relative_path):
         """ Get absolute path to resource, works for dev and for PyInstaller """